@@ -1,5 +1,5 @@
-from pydantic_settings import BaseSettings
-from pydantic import ConfigDict
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional
 
 class Settings(BaseSettings):
     # Configuration values used by the API
@@ -8,10 +8,19 @@ class Settings(BaseSettings):
     SNAPSHOT_INTERVAL_MINUTES: int = 60  # Default: 1 hour
     AUTO_SNAPSHOT: bool = True
     SNAPSHOT_TIMEOUT_SECONDS: int = 60  # Timeout for snapshot retrieval (large files)
+    IPFS_UDS_PATH: Optional[str] = None  # Kubo API Unix socket (TCP to IPFS_API_URL if unset)
 
-    model_config = ConfigDict(
+    model_config = SettingsConfigDict(
         env_file=".env",
-        extra="ignore"  # Ignore extra fields in .env (used by scripts)
+        extra="ignore",  # Ignore extra fields in .env (used by scripts)
+        frozen=True      # Read once at import; safe to share across tasks
     )
 
 settings = Settings()
+
+# Kubo RPC endpoints, formatted once instead of per request
+DAG_GET_URL = f"{settings.IPFS_API_URL}/dag/get"
+BLOCK_PUT_URL = f"{settings.IPFS_API_URL}/block/put"
+PIN_ADD_URL = f"{settings.IPFS_API_URL}/pin/add"
+FILES_READ_URL = f"{settings.IPFS_API_URL}/files/read"
+FILES_WRITE_URL = f"{settings.IPFS_API_URL}/files/write"
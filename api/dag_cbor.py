@@ -0,0 +1,81 @@
+"""
+Minimal dag-cbor encoder for event blocks.
+
+Covers the subset of the data model our events use (maps with string
+keys, strings, ints, bools, null, lists, bytes). Map keys are sorted
+length-first then bytewise, as the dag-cbor spec requires, so the output
+is byte-identical to what Kubo produces when it re-encodes the same
+document itself.
+
+Links stay encoded as plain {"/": cid} maps (not tag 42) - see
+dr/DAG_JSON_VS_JSON.md for why the event chain uses unpinned "fake" links.
+"""
+
+import base64
+import hashlib
+
+
+def _head(major: int, value: int) -> bytes:
+    """Encode a CBOR initial byte plus argument (always minimal length)."""
+    if value < 24:
+        return bytes([(major << 5) | value])
+    if value < 0x100:
+        return bytes([(major << 5) | 24, value])
+    if value < 0x10000:
+        return bytes([(major << 5) | 25]) + value.to_bytes(2, "big")
+    if value < 0x100000000:
+        return bytes([(major << 5) | 26]) + value.to_bytes(4, "big")
+    return bytes([(major << 5) | 27]) + value.to_bytes(8, "big")
+
+
+def _encode(obj, out: bytearray):
+    if obj is None:
+        out.append(0xF6)
+    elif obj is True:
+        out.append(0xF5)
+    elif obj is False:
+        out.append(0xF4)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            out += _head(0, obj)
+        else:
+            out += _head(1, -1 - obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        out += _head(3, len(data))
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        out += _head(2, len(obj))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        out += _head(4, len(obj))
+        for item in obj:
+            _encode(item, out)
+    elif isinstance(obj, dict):
+        keys = [(k.encode("utf-8"), k) for k in obj]
+        keys.sort(key=lambda kv: (len(kv[0]), kv[0]))
+        out += _head(5, len(keys))
+        for key_bytes, key in keys:
+            out += _head(3, len(key_bytes))
+            out += key_bytes
+            _encode(obj[key], out)
+    else:
+        raise TypeError(f"Cannot dag-cbor encode {type(obj).__name__}")
+
+
+def encode(obj) -> bytes:
+    """Encode a Python object as canonical dag-cbor bytes."""
+    out = bytearray()
+    _encode(obj, out)
+    return bytes(out)
+
+
+# CIDv1 prefix for a dag-cbor block with a sha2-256 multihash:
+# version 1, codec 0x71 (dag-cbor), hash 0x12 (sha2-256), length 32.
+_CID_PREFIX = bytes([0x01, 0x71, 0x12, 0x20])
+
+
+def cid_for(block: bytes) -> str:
+    """Compute the CIDv1 (base32) Kubo assigns to a dag-cbor block."""
+    raw = _CID_PREFIX + hashlib.sha256(block).digest()
+    return "b" + base64.b32encode(raw).decode("ascii").lower().rstrip("=")
@@ -8,27 +8,43 @@ prove that no historical data has been deleted between snapshots.
 """
 
 import sys
-import json
+import orjson
 import os
+import fcntl
 import time
 import hashlib
-import subprocess
+import threading
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List, Set, Tuple
+from typing import Optional, Callable, Dict, Any, List, Set, Tuple
 import httpx
 
 # Configuration
 IPFS_API = os.getenv("IPFS_API_URL", "http://localhost:5001/api/v0")
-CONTAINER_NAME = os.getenv("CONTAINER_NAME", "ipfs-node")
+IPFS_UDS_PATH = os.getenv("IPFS_UDS_PATH")  # Kubo API Unix socket (TCP to IPFS_API if unset)
 INDEX_POINTER_PATH = os.getenv("INDEX_POINTER_PATH", "/arke/index-pointer")
 SNAPSHOTS_DIR = Path(os.getenv("SNAPSHOTS_DIR", "./snapshots"))
 CHECKPOINT_FILE = Path("/tmp/snapshot-entries.ndjson")
+CHECKPOINT_BUFFER = 1 << 20  # 1 MiB I/O buffer for checkpoint NDJSON
+SNAPSHOT_FILE = Path("/tmp/snapshot-body.json")  # Serialized snapshot, streamed to dag/put
+STREAM_CHUNK = 10_000  # List items encoded per write when serializing the snapshot
 LOCK_FILE = Path("/tmp/arke-snapshot.lock")
+_lock_fd: Optional[int] = None  # Held while a build is running
+
+# Shared keep-alive client for all builder requests
+_http_client: Optional[httpx.Client] = None
+
+# Optional pointer writer (snapshot fields dict -> None). With --defer-pointer
+# the fields are handed back to the API scheduler, which merges them through
+# its index_pointer module, serialized with the event worker's pointer updates.
+_pointer_updater: Optional[Callable[[Dict[str, Any]], None]] = None
 
 # Progress logging
 LOG_INTERVAL = 100
 TIMEOUT = 30.0  # HTTP timeout for individual requests
+CID_WORKERS = int(os.getenv("SNAPSHOT_CID_WORKERS", "16"))  # Concurrent version-chain walks
 
 # Colors
 BLUE = '\033[0;34m'
@@ -37,20 +53,52 @@ YELLOW = '\033[1;33m'
 RED = '\033[0;31m'
 NC = '\033[0m'
 
+# Progress output stream (stderr for CLI runs, the API passes its log file)
+_log_stream = sys.stderr
+
 def log(msg: str):
-    print(f"{BLUE}[INFO]{NC} {msg}", file=sys.stderr)
+    print(f"{BLUE}[INFO]{NC} {msg}", file=_log_stream)
 
 def success(msg: str):
-    print(f"{GREEN}[SUCCESS]{NC} {msg}", file=sys.stderr)
+    print(f"{GREEN}[SUCCESS]{NC} {msg}", file=_log_stream)
 
 def warn(msg: str):
-    print(f"{YELLOW}[WARN]{NC} {msg}", file=sys.stderr)
+    print(f"{YELLOW}[WARN]{NC} {msg}", file=_log_stream)
 
 def error(msg: str):
-    print(f"{RED}[ERROR]{NC} {msg}", file=sys.stderr)
+    print(f"{RED}[ERROR]{NC} {msg}", file=_log_stream)
     sys.exit(1)
 
 
+def get_http_client() -> httpx.Client:
+    """Get or create the shared HTTP client (pool sized for CID workers)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        limits = httpx.Limits(
+            max_connections=CID_WORKERS,
+            max_keepalive_connections=CID_WORKERS
+        )
+        _http_client = httpx.Client(
+            timeout=TIMEOUT,
+            transport=httpx.HTTPTransport(uds=IPFS_UDS_PATH, limits=limits)
+        )
+    return _http_client
+
+def fetch_event(client: httpx.Client, cid: str) -> Dict[str, Any]:
+    """Fetch an event by CID."""
+    response = client.post(
+        f"{IPFS_API}/dag/get",
+        params={"arg": cid}
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def link_cid(value: Any) -> Optional[str]:
+    """CID from a dag-json link ({"/": cid}) or a bare CID string; None if absent."""
+    if type(value) is dict:
+        return value.get("/") or None
+    return value or None
+
 # =============================================================================
 # Append-Only Proof Implementation (RFC 6962-style Merkle Tree)
 # =============================================================================
@@ -66,76 +114,142 @@ class SimpleMerkleTree:
 
     def __init__(self, leaves: List[bytes]):
         self.leaves = leaves
-        self.levels = self._build_tree(leaves)
+        self._levels: Optional[List[bytes]] = None
+        self._root = self._compute_root(leaves)
+
+    @staticmethod
+    def _hash_leaves(leaves: List[bytes]) -> bytes:
+        sha256 = hashlib.sha256
+        return b''.join([sha256(leaf).digest() for leaf in leaves])
+
+    @staticmethod
+    def _next_level(level: bytes) -> bytes:
+        """
+        Hash one level (a contiguous buffer of 32-byte hashes) into its
+        parent level, hashing 64-byte memoryview slices so no per-pair
+        concatenation is allocated.
+        """
+        if len(level) % 64:
+            # Odd node count: pair the last node with itself
+            level += level[-32:]
+        sha256 = hashlib.sha256
+        mv = memoryview(level)
+        return b''.join([
+            sha256(mv[i:i + 64]).digest()
+            for i in range(0, len(mv), 64)
+        ])
+
+    def _compute_root(self, leaves: List[bytes]) -> bytes:
+        """Reduce to the root keeping only the current level in memory."""
+        if not leaves:
+            return hashlib.sha256(b'').digest()
 
-    def _hash(self, data: bytes) -> bytes:
-        return hashlib.sha256(data).digest()
+        current_level = self._hash_leaves(leaves)
+        while len(current_level) > 32:
+            current_level = self._next_level(current_level)
+        return current_level
 
-    def _build_tree(self, leaves: List[bytes]) -> List[List[bytes]]:
+    def _build_tree(self, leaves: List[bytes]) -> List[bytes]:
+        """Build all levels bottom-up, each one contiguous buffer of hashes."""
         if not leaves:
-            return [[self._hash(b'')]]
+            return [hashlib.sha256(b'').digest()]
 
-        # Hash leaves
-        current_level = [self._hash(leaf) for leaf in leaves]
+        current_level = self._hash_leaves(leaves)
         levels = [current_level]
-
-        # Build tree bottom-up
-        while len(current_level) > 1:
-            next_level = []
-            for i in range(0, len(current_level), 2):
-                left = current_level[i]
-                right = current_level[i + 1] if i + 1 < len(current_level) else left
-                next_level.append(self._hash(left + right))
-            current_level = next_level
+        while len(current_level) > 32:
+            current_level = self._next_level(current_level)
             levels.append(current_level)
 
         return levels
 
+    @property
+    def levels(self) -> List[bytes]:
+        """All tree levels (built on first access; only needed for proofs)."""
+        if self._levels is None:
+            self._levels = self._build_tree(self.leaves)
+        return self._levels
+
     @property
     def root(self) -> str:
-        return self.levels[-1][0].hex()
+        return self._root.hex()
 
     @property
     def leaf_count(self) -> int:
         return len(self.leaves)
 
 
-def collect_version_chain_cids(tip_cid: str, client: httpx.Client) -> List[str]:
+# Manifest links (component CIDs, prev CID) keyed by manifest CID. Manifests
+# are immutable, so entries never go stale. The cache lives for one build
+# (each build runs in its own process), so a version reached by more than one
+# walk is fetched once.
+MANIFEST_CACHE_SIZE = 100_000
+_manifest_cache: OrderedDict[str, Tuple[List[str], Optional[str]]] = OrderedDict()
+_manifest_cache_lock = threading.Lock()
+
+
+def fetch_manifest_links(cid: str, client: httpx.Client) -> Tuple[List[str], Optional[str]]:
+    """Return (component CIDs, prev CID) for a manifest, via the LRU cache."""
+    with _manifest_cache_lock:
+        links = _manifest_cache.get(cid)
+        if links is not None:
+            _manifest_cache.move_to_end(cid)
+            return links
+
+    response = client.post(
+        f"{IPFS_API}/dag/get",
+        params={"arg": cid}
+    )
+    response.raise_for_status()
+    manifest = orjson.loads(response.content)
+
+    components = []
+    for comp_name, comp_link in manifest.get("components", {}).items():
+        comp_cid = link_cid(comp_link)
+        if comp_cid:
+            components.append(comp_cid)
+
+    prev = link_cid(manifest.get("prev"))
+
+    links = (components, prev)
+    with _manifest_cache_lock:
+        _manifest_cache[cid] = links
+        if len(_manifest_cache) > MANIFEST_CACHE_SIZE:
+            _manifest_cache.popitem(last=False)
+    return links
+
+
+def collect_version_chain_cids(tip_cid: str, client: httpx.Client) -> Set[str]:
     """
     Walk the prev chain from tip to collect ALL version CIDs for an entity.
     Also collects component CIDs (metadata, files, images) from each manifest.
 
-    Returns list of all CIDs in this entity's history.
+    Returns the set of all CIDs in this entity's history (components shared
+    between versions appear once).
     """
-    cids = []
+    cids = set()
+    collected = 0  # Counts repeats too, so the depth limit is unchanged
     current = tip_cid
     max_depth = 100  # Safety limit
 
-    while current and len(cids) < max_depth:
-        cids.append(current)
+    while current and collected < max_depth:
+        if current in cids:
+            # Already visited: a cycle in prev links
+            break
+        cids.add(current)
+        collected += 1
 
         try:
-            response = client.post(
-                f"{IPFS_API}/dag/get",
-                params={"arg": current}
-            )
-            response.raise_for_status()
-            manifest = response.json()
+            components, prev = fetch_manifest_links(current, client)
         except Exception as e:
             warn(f"Failed to fetch manifest {current[:16]}...: {e}")
             break
 
         # Get component CIDs
-        for comp_name, comp_link in manifest.get("components", {}).items():
-            comp_cid = comp_link.get("/") if isinstance(comp_link, dict) else comp_link
-            if comp_cid:
-                cids.append(comp_cid)
+        cids.update(components)
+        collected += len(components)
 
         # Move to previous version
-        prev_obj = manifest.get("prev")
-        if not prev_obj:
-            break
-        current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
+        current = prev
 
     return cids
 
@@ -167,26 +281,28 @@ def collect_all_cids(
         entries_to_walk = entries
         log(f"Collecting CIDs for {len(entries_to_walk)} entities (full)")
 
-    with httpx.Client(timeout=TIMEOUT) as client:
-        processed = 0
-        for entry in entries_to_walk:
-            tip_cid = entry.get("tip_cid", {})
-            if isinstance(tip_cid, dict):
-                tip_cid = tip_cid.get("/")
+    def walk_entry(entry: Dict[str, Any]) -> Set[str]:
+        tip_cid = link_cid(entry.get("tip_cid"))
 
-            if not tip_cid:
-                continue
+        if not tip_cid:
+            return set()
+
+        # Collect all versions and components for this entity
+        cids = collect_version_chain_cids(tip_cid, client)
 
-            # Collect all versions and components for this entity
-            version_cids = collect_version_chain_cids(tip_cid, client)
-            all_cids.update(version_cids)
+        # Also add chain entry CID
+        chain_cid = link_cid(entry.get("chain_cid"))
+        if chain_cid:
+            cids.add(chain_cid)
+        return cids
 
-            # Also add chain entry CID
-            chain_cid = entry.get("chain_cid", {})
-            if isinstance(chain_cid, dict):
-                chain_cid = chain_cid.get("/")
-            if chain_cid:
-                all_cids.add(chain_cid)
+    # Each entity's version chain is independent, so walk them on a pool of
+    # worker threads sharing one connection pool (each walk is RTT-bound)
+    client = get_http_client()
+    with ThreadPoolExecutor(max_workers=CID_WORKERS) as pool:
+        processed = 0
+        for cids in pool.map(walk_entry, entries_to_walk):
+            all_cids.update(cids)
 
             processed += 1
             if processed % 100 == 0:
@@ -199,12 +315,22 @@ def collect_all_cids(
     return all_cids
 
 
-def build_merkle_root(cids: Set[str]) -> Tuple[str, List[str]]:
+def build_merkle_root(cids: Set[str], prev_sorted_cids: List[str] = None) -> Tuple[str, List[str]]:
     """
     Build Merkle tree from CID set.
     Returns (merkle_root, sorted_cid_list).
+
+    prev_sorted_cids: the previous snapshot's (sorted) all_cids. Only the new
+    CIDs are then sorted, and the final sort is a linear merge of two runs.
+    Previous CIDs missing from cids (a deletion) are dropped from the run, so
+    the tree always covers exactly cids.
     """
-    sorted_cids = sorted(cids)
+    if prev_sorted_cids:
+        prev_run = [cid for cid in prev_sorted_cids if cid in cids]
+        sorted_cids = prev_run + sorted(cids.difference(prev_run))
+        sorted_cids.sort()
+    else:
+        sorted_cids = sorted(cids)
     leaves = [cid.encode() for cid in sorted_cids]
     tree = SimpleMerkleTree(leaves)
     return tree.root, sorted_cids
@@ -220,8 +346,11 @@ def generate_consistency_info(
     Verifies append-only property: curr_cids ⊇ prev_cids (no deletions).
     Returns info dict with verification status.
     """
-    deleted = prev_cids - curr_cids
-    added = curr_cids - prev_cids
+    # Expected case is append-only: issubset() allocates nothing, and the
+    # exact difference is only computed when something was deleted
+    deleted = set() if prev_cids.issubset(curr_cids) else prev_cids - curr_cids
+    # |curr - prev| = |curr| - |prev ∩ curr|, so the added set is never built
+    added_count = len(curr_cids) - (len(prev_cids) - len(deleted))
 
     if deleted:
         # This should never happen in normal operation
@@ -232,45 +361,65 @@ def generate_consistency_info(
     return {
         "prev_cid_count": len(prev_cids),
         "curr_cid_count": len(curr_cids),
-        "added_count": len(added),
+        "added_count": added_count,
         "deleted_count": len(deleted),
         "is_append_only": len(deleted) == 0
     }
 
 
 def check_lock():
-    """Check for existing lock file."""
-    if LOCK_FILE.exists():
-        lock_age = time.time() - LOCK_FILE.stat().st_mtime
-        if lock_age < 600:  # 10 minutes
-            error(f"Snapshot build already in progress (lock file exists: {LOCK_FILE})")
-        else:
-            warn(f"Removing stale lock file (age: {lock_age:.0f}s)")
-            LOCK_FILE.unlink()
+    """Take the build lock, exiting if another build holds it.
+
+    Uses flock rather than lock-file existence: the kernel drops the lock
+    when the holder exits, so a crashed build never leaves a stale lock.
+    The lock only counts if the locked inode is still the one at LOCK_FILE:
+    if the file was deleted or replaced meanwhile, lock the new file instead
+    (a running build holding the old inode would otherwise go unnoticed).
+    """
+    global _lock_fd
+    while True:
+        fd = os.open(LOCK_FILE, os.O_CREAT | os.O_WRONLY, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            error(f"Snapshot build already in progress (lock held: {LOCK_FILE})")
+
+        try:
+            if os.fstat(fd).st_ino == os.stat(LOCK_FILE).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        os.close(fd)
 
-    # Create lock
-    LOCK_FILE.write_text(f"{os.getpid()}|{int(time.time())}")
+    # Record holder for debugging
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()}|{int(time.time())}".encode())
+    _lock_fd = fd
 
 def cleanup_lock():
-    """Remove lock file."""
-    if LOCK_FILE.exists():
-        LOCK_FILE.unlink()
+    """Release the build lock (safe to call more than once)."""
+    global _lock_fd
+    if _lock_fd is not None:
+        fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+        os.close(_lock_fd)
+        _lock_fd = None
 
 def get_index_pointer() -> Dict[str, Any]:
     """Read index pointer from MFS."""
     log("Reading index pointer from MFS...")
     try:
-        with httpx.Client(timeout=TIMEOUT) as client:
-            response = client.post(
-                f"{IPFS_API}/files/read",
-                params={"arg": INDEX_POINTER_PATH}
-            )
-            response.raise_for_status()
-            pointer = response.json()
-            log(f"Index pointer: event_head={pointer.get('event_head', 'none')[:16]}..., "
-                f"event_count={pointer.get('event_count', 0)}, "
-                f"total_count={pointer.get('total_count', 0)}")
-            return pointer
+        client = get_http_client()
+        response = client.post(
+            f"{IPFS_API}/files/read",
+            params={"arg": INDEX_POINTER_PATH}
+        )
+        response.raise_for_status()
+        pointer = orjson.loads(response.content)
+        log(f"Index pointer: event_head={pointer.get('event_head', 'none')[:16]}..., "
+            f"event_count={pointer.get('event_count', 0)}, "
+            f"total_count={pointer.get('total_count', 0)}")
+        return pointer
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 500:  # File doesn't exist
             return {}
@@ -287,13 +436,13 @@ def load_previous_snapshot(snapshot_cid: str) -> Tuple[Dict[str, Any], Dict[str,
     """
     log(f"Loading previous snapshot: {snapshot_cid[:16]}...")
 
-    with httpx.Client(timeout=TIMEOUT) as client:
-        response = client.post(
-            f"{IPFS_API}/dag/get",
-            params={"arg": snapshot_cid}
-        )
-        response.raise_for_status()
-        snapshot = response.json()
+    client = get_http_client()
+    response = client.post(
+        f"{IPFS_API}/dag/get",
+        params={"arg": snapshot_cid}
+    )
+    response.raise_for_status()
+    snapshot = orjson.loads(response.content)
 
     entries_dict = {e["pi"]: e for e in snapshot.get("entries", [])}
 
@@ -308,118 +457,148 @@ def load_previous_snapshot(snapshot_cid: str) -> Tuple[Dict[str, Any], Dict[str,
 
     return entries_dict, snapshot, prev_all_cids
 
-def walk_event_chain_incremental(event_head: str, stop_at_cid: str, prev_entries: Dict[str, Any], checkpoint_file: Path) -> tuple[int, int]:
+def resolve_entry_state(client: httpx.Client, event: Dict[str, Any], pi: str) -> Optional[Tuple[str, int]]:
+    """
+    Get (tip_cid, ver) for the PI an event refers to.
+
+    arke/event@v1 events carry tip_cid and ver, and the chain is walked
+    newest-first, so the first event seen for a PI already holds its state
+    as of event_head - no extra round trips. Events without those fields
+    fall back to reading the .tip from MFS and the manifest's version.
+    Returns None if the tip cannot be resolved.
+    """
+    tip_cid = link_cid(event.get("tip_cid"))
+    if tip_cid and event.get("ver") is not None:
+        return tip_cid, event["ver"]
+
+    # Read current tip from MFS
+    shard1 = pi[:2]
+    shard2 = pi[2:4]
+    tip_path = f"/arke/index/{shard1}/{shard2}/{pi}.tip"
+
+    try:
+        response = client.post(
+            f"{IPFS_API}/files/read",
+            params={"arg": tip_path}
+        )
+        response.raise_for_status()
+        tip_cid = response.text.strip()
+    except Exception as e:
+        warn(f"Failed to read tip for {pi}: {e}")
+        return None
+
+    # Fetch manifest to get version
+    try:
+        response = client.post(
+            f"{IPFS_API}/dag/get",
+            params={"arg": tip_cid}
+        )
+        response.raise_for_status()
+        manifest = orjson.loads(response.content)
+        ver = manifest.get("ver", 0)
+    except Exception as e:
+        warn(f"Failed to fetch manifest for {pi}: {e}")
+        ver = 0
+
+    return tip_cid, ver
+
+def walk_event_chain_incremental(event_head: str, stop_at_cid: str, prev_entries: Dict[str, Any], checkpoint_file: Path) -> Tuple[int, Set[str], List[Dict[str, Any]]]:
     """
     Walk ONLY new events from event_head back to stop_at_cid.
     Update prev_entries dict for modified/new PIs.
-    Returns (events_processed, pis_modified).
+    Returns (events_processed, set of modified/new PIs, all entries).
+
+    The entries (also written to the checkpoint) are oldest first, in the
+    order a full walk ends up with: unchanged entries keep their previous
+    order and updated entries move to the end, ordered by their latest event.
     """
     log(f"Walking new events from {event_head[:16]}... to {stop_at_cid[:16]}...")
 
     current = event_head
     events_processed = 0
     pis_modified = set()
+    updated_pis = []  # PIs with a new entry, newest event first
     start_time = time.time()
 
-    with httpx.Client(timeout=TIMEOUT) as client:
-        while current and current != stop_at_cid:
-            # Fetch event
-            try:
-                response = client.post(
-                    f"{IPFS_API}/dag/get",
-                    params={"arg": current}
-                )
-                response.raise_for_status()
-                event = response.json()
-            except Exception as e:
-                warn(f"Failed to fetch event {current[:16]}: {e}")
-                break
-
-            events_processed += 1
-
-            # Extract PI
-            pi = event.get("pi")
-            ts = event.get("ts")
-
-            if not pi:
-                warn(f"Event {current[:16]} has no PI, skipping")
-                prev_obj = event.get("prev")
-                if not prev_obj:
-                    break
-                current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
-                continue
-
-            # Track that we modified/added this PI
-            pis_modified.add(pi)
+    client = get_http_client()
+    while current and current != stop_at_cid:
+        # Fetch event
+        try:
+            event = fetch_event(client, current)
+        except Exception as e:
+            warn(f"Failed to fetch event {current[:16]}: {e}")
+            break
 
-            # Read current tip from MFS
-            shard1 = pi[:2]
-            shard2 = pi[2:4]
-            tip_path = f"/arke/index/{shard1}/{shard2}/{pi}.tip"
+        events_processed += 1
 
-            try:
-                response = client.post(
-                    f"{IPFS_API}/files/read",
-                    params={"arg": tip_path}
-                )
-                response.raise_for_status()
-                tip_cid = response.text.strip()
-            except Exception as e:
-                warn(f"Failed to read tip for {pi}: {e}")
-                prev_obj = event.get("prev")
-                if not prev_obj:
-                    break
-                current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
-                continue
+        # Extract PI
+        pi = event.get("pi")
+        ts = event.get("ts")
 
-            # Fetch manifest to get version
-            try:
-                response = client.post(
-                    f"{IPFS_API}/dag/get",
-                    params={"arg": tip_cid}
-                )
-                response.raise_for_status()
-                manifest = response.json()
-                ver = manifest.get("ver", 0)
-            except Exception as e:
-                warn(f"Failed to fetch manifest for {pi}: {e}")
-                ver = 0
+        if not pi:
+            warn(f"Event {current[:16]} has no PI, skipping")
+            current = link_cid(event.get("prev"))
+            if not current:
+                break
+            continue
 
-            # Update/add entry in dict
-            prev_entries[pi] = {
-                "pi": pi,
-                "ver": ver,
-                "tip_cid": {"/": tip_cid},
-                "ts": ts,
-                "chain_cid": {"/": current}
-            }
+        # Newest event wins: older events for the same PI are superseded
+        if pi in pis_modified:
+            current = link_cid(event.get("prev"))
+            if not current:
+                break
+            continue
 
-            # Progress logging
-            if events_processed % LOG_INTERVAL == 0:
-                elapsed = time.time() - start_time
-                rate = events_processed / elapsed
-                log(f"Processed {events_processed} new events ({rate:.1f} events/sec, {elapsed:.0f}s elapsed)")
+        # Track that we modified/added this PI
+        pis_modified.add(pi)
 
-            # Move to previous event
-            prev_obj = event.get("prev")
-            if not prev_obj:
+        state = resolve_entry_state(client, event, pi)
+        if state is None:
+            current = link_cid(event.get("prev"))
+            if not current:
                 break
-            current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
+            continue
+        tip_cid, ver = state
+
+        # Update/add entry in dict
+        updated_pis.append(pi)
+        prev_entries[pi] = {
+            "pi": pi,
+            "ver": ver,
+            "tip_cid": {"/": tip_cid},
+            "ts": ts,
+            "chain_cid": {"/": current}
+        }
+
+        # Progress logging
+        if events_processed % LOG_INTERVAL == 0:
+            elapsed = time.time() - start_time
+            rate = events_processed / elapsed
+            log(f"Processed {events_processed} new events ({rate:.1f} events/sec, {elapsed:.0f}s elapsed)")
+
+        # Move to previous event
+        current = link_cid(event.get("prev"))
+        if not current:
+            break
 
     elapsed = time.time() - start_time
     success(f"Incremental walk: {events_processed} events, {len(pis_modified)} PIs modified/added in {elapsed:.1f}s")
 
+    updated = set(updated_pis)
+    entries = [entry for pi, entry in prev_entries.items() if pi not in updated]
+    entries.extend(prev_entries[pi] for pi in reversed(updated_pis))
+
     # Write all entries to checkpoint file
     log("Writing entries to checkpoint file...")
-    with open(checkpoint_file, 'w') as f:
-        for entry in prev_entries.values():
-            f.write(json.dumps(entry) + "\n")
+    with open(checkpoint_file, 'wb', buffering=CHECKPOINT_BUFFER) as f:
+        for entry in entries:
+            f.write(orjson.dumps(entry) + b"\n")
 
-    return events_processed, len(pis_modified)
+    return events_processed, pis_modified, entries
 
 def walk_event_chain(event_head: str, checkpoint_file: Path) -> int:
     """
-    Walk entire event chain and write entries to checkpoint file.
+    Walk entire event chain and write entries to checkpoint file (newest first).
     Returns count of unique PIs processed.
     """
     log(f"Walking ENTIRE event chain from head: {event_head[:16]}...")
@@ -430,138 +609,90 @@ def walk_event_chain(event_head: str, checkpoint_file: Path) -> int:
     seen_pis = set()
     start_time = time.time()
 
-    with httpx.Client(timeout=TIMEOUT) as client:
-        with open(checkpoint_file, 'w') as f:
-            while current:
-                # Fetch event
-                try:
-                    response = client.post(
-                        f"{IPFS_API}/dag/get",
-                        params={"arg": current}
-                    )
-                    response.raise_for_status()
-                    event = response.json()
-                except Exception as e:
-                    warn(f"Failed to fetch event {current[:16]}: {e}")
+    client = get_http_client()
+    with open(checkpoint_file, 'wb', buffering=CHECKPOINT_BUFFER) as f:
+        while current:
+            # Fetch event
+            try:
+                event = fetch_event(client, current)
+            except Exception as e:
+                warn(f"Failed to fetch event {current[:16]}: {e}")
+                break
+
+            # Extract PI
+            pi = event.get("pi")
+            event_type = event.get("type")
+            ts = event.get("ts")
+
+            if not pi:
+                warn(f"Event {current[:16]} has no PI, skipping")
+                current = link_cid(event.get("prev"))
+                if not current:
                     break
+                continue
 
-                # Extract PI
-                pi = event.get("pi")
-                event_type = event.get("type")
-                ts = event.get("ts")
-
-                if not pi:
-                    warn(f"Event {current[:16]} has no PI, skipping")
-                    prev_obj = event.get("prev")
-                    if not prev_obj:
-                        break
-                    current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
-                    if not current:
-                        break
-                    continue
-
-                # Skip if already seen
-                if pi in seen_pis:
-                    prev_obj = event.get("prev")
-                    if not prev_obj:
-                        break
-                    current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
-                    if not current:
-                        break
-                    continue
-
-                seen_pis.add(pi)
-                count += 1
-
-                # Read current tip from MFS
-                shard1 = pi[:2]
-                shard2 = pi[2:4]
-                tip_path = f"/arke/index/{shard1}/{shard2}/{pi}.tip"
-
-                try:
-                    response = client.post(
-                        f"{IPFS_API}/files/read",
-                        params={"arg": tip_path}
-                    )
-                    response.raise_for_status()
-                    tip_cid = response.text.strip()
-                except Exception as e:
-                    warn(f"Failed to read tip for {pi}: {e}")
-                    prev_obj = event.get("prev")
-                    if not prev_obj:
-                        break
-                    current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
-                    if not current:
-                        break
-                    continue
-
-                # Fetch manifest to get version
-                try:
-                    response = client.post(
-                        f"{IPFS_API}/dag/get",
-                        params={"arg": tip_cid}
-                    )
-                    response.raise_for_status()
-                    manifest = response.json()
-                    ver = manifest.get("ver", 0)
-                except Exception as e:
-                    warn(f"Failed to fetch manifest for {pi}: {e}")
-                    ver = 0
-
-                # Write entry to checkpoint file
-                entry = {
-                    "pi": pi,
-                    "ver": ver,
-                    "tip_cid": {"/": tip_cid},
-                    "ts": ts,
-                    "chain_cid": {"/": current}
-                }
-                f.write(json.dumps(entry) + "\n")
-
-                # Progress logging
-                if count % LOG_INTERVAL == 0:
-                    elapsed = time.time() - start_time
-                    rate = count / elapsed
-                    log(f"Processed {count} unique PIs ({rate:.1f} entries/sec, {elapsed:.0f}s elapsed)")
-
-                # Move to previous event
-                prev_obj = event.get("prev")
-                if not prev_obj:
+            # Skip if already seen
+            if pi in seen_pis:
+                current = link_cid(event.get("prev"))
+                if not current:
                     break
-                current = prev_obj.get("/") if isinstance(prev_obj, dict) else prev_obj
+                continue
+
+            seen_pis.add(pi)
+            count += 1
+
+            state = resolve_entry_state(client, event, pi)
+            if state is None:
+                current = link_cid(event.get("prev"))
                 if not current:
                     break
+                continue
+            tip_cid, ver = state
+
+            # Write entry to checkpoint file
+            entry = {
+                "pi": pi,
+                "ver": ver,
+                "tip_cid": {"/": tip_cid},
+                "ts": ts,
+                "chain_cid": {"/": current}
+            }
+            f.write(orjson.dumps(entry) + b"\n")
+
+            # Progress logging
+            if count % LOG_INTERVAL == 0:
+                elapsed = time.time() - start_time
+                rate = count / elapsed
+                log(f"Processed {count} unique PIs ({rate:.1f} entries/sec, {elapsed:.0f}s elapsed)")
+
+            # Move to previous event
+            current = link_cid(event.get("prev"))
+            if not current:
+                break
 
     elapsed = time.time() - start_time
     success(f"Full traversal: {count} unique PIs in {elapsed:.0f}s ({count/elapsed:.1f} entries/sec)")
     return count
 
 def build_snapshot_json(
-    checkpoint_file: Path,
+    entries: List[Dict[str, Any]],
     pointer: Dict[str, Any],
     seq: int,
     timestamp: str,
     total_count: int,
     all_cids: Set[str] = None,
-    prev_all_cids: Set[str] = None
+    prev_all_cids: Set[str] = None,
+    prev_sorted_cids: List[str] = None
 ) -> Dict[str, Any]:
     """
-    Build final snapshot JSON from checkpoint file.
+    Build final snapshot JSON from the checkpoint entries (as read back
+    for CID collection, in chronological order).
 
     If all_cids is provided, includes append-only proof fields (v2 schema).
     """
-    log("Building snapshot JSON from checkpoint file...")
-
-    # Read all entries
-    entries = []
-    with open(checkpoint_file) as f:
-        for line in f:
-            entries.append(json.loads(line))
+    log("Building snapshot JSON from checkpoint entries...")
 
-    # Reverse to get chronological order (oldest first)
-    entries.reverse()
-
-    log(f"Loaded {len(entries)} entries from checkpoint")
+    log(f"Using {len(entries)} entries from checkpoint")
 
     # Build snapshot object
     snapshot = {
@@ -583,7 +714,7 @@ def build_snapshot_json(
     # Add append-only proof fields if CIDs were collected
     if all_cids:
         log("Building Merkle tree for append-only proof...")
-        merkle_root, sorted_cids = build_merkle_root(all_cids)
+        merkle_root, sorted_cids = build_merkle_root(all_cids, prev_sorted_cids)
 
         snapshot["merkle_root"] = merkle_root
         snapshot["cid_count"] = len(all_cids)
@@ -611,70 +742,118 @@ def build_snapshot_json(
 
     return snapshot
 
-def store_snapshot_ipfs_cli(snapshot: Dict[str, Any]) -> str:
-    """Store snapshot using ipfs CLI via docker exec."""
-    log("Storing snapshot via ipfs CLI...")
+def write_snapshot_file(snapshot: Dict[str, Any], path: Path) -> int:
+    """
+    Serialize the snapshot as compact JSON to `path` and return its size.
 
-    snapshot_json = json.dumps(snapshot, indent=2)
-    log(f"Snapshot JSON size: {len(snapshot_json) / 1024 / 1024:.2f} MB")
+    The large lists (entries, all_cids) are encoded STREAM_CHUNK items at a
+    time, so the full document never exists as one bytes object in memory.
+    """
+    with open(path, 'wb', buffering=CHECKPOINT_BUFFER) as f:
+        f.write(b"{")
+        for i, (key, value) in enumerate(snapshot.items()):
+            if i:
+                f.write(b",")
+            f.write(orjson.dumps(key) + b":")
+
+            if type(value) is not list:
+                f.write(orjson.dumps(value))
+                continue
 
-    # Use docker exec to run ipfs dag put
+            f.write(b"[")
+            for start in range(0, len(value), STREAM_CHUNK):
+                if start:
+                    f.write(b",")
+                # Strip the brackets: chunks join into one array
+                f.write(orjson.dumps(value[start:start + STREAM_CHUNK])[1:-1])
+            f.write(b"]")
+        f.write(b"}")
+        return f.tell()
+
+def store_snapshot_ipfs(snapshot: Dict[str, Any]) -> str:
+    """Store snapshot as dag-json via the Kubo HTTP API (dag/put)."""
+    log("Storing snapshot via dag/put...")
+
+    # Compact: Kubo re-encodes to canonical dag-json, so whitespace only costs
+    # encode time and upload bytes (the stored block and CID are the same)
+    size = write_snapshot_file(snapshot, SNAPSHOT_FILE)
+    log(f"Snapshot JSON size: {size / 1024 / 1024:.2f} MB")
+
+    # Same options as `ipfs dag put` on the CLI, without a docker exec round trip
     try:
-        result = subprocess.run(
-            ["docker", "exec", "-i", CONTAINER_NAME, "ipfs", "dag", "put",
-             "--store-codec=dag-json", "--input-codec=json", "--pin=true",
-             "--allow-big-block"],
-            input=snapshot_json,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout for large files
-        )
-
-        if result.returncode != 0:
-            error(f"ipfs dag put failed: {result.stderr}")
-
-        # Parse CID from output (plain CID string)
-        snapshot_cid = result.stdout.strip()
+        # The request body is streamed from the file in chunks
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            response = get_http_client().post(
+                f"{IPFS_API}/dag/put",
+                params={
+                    "store-codec": "dag-json",
+                    "input-codec": "json",
+                    "pin": "true",
+                    "allow-big-block": "true"
+                },
+                files={"file": ("snapshot.json", f, "application/json")},
+                timeout=300.0  # 5 minute timeout for large files
+            )
+        response.raise_for_status()
+        snapshot_cid = orjson.loads(response.content)["Cid"]["/"]
 
         success(f"Snapshot stored: {snapshot_cid}")
         return snapshot_cid
 
-    except subprocess.TimeoutExpired:
+    except httpx.TimeoutException:
         error("ipfs dag put timed out after 5 minutes")
+    except httpx.HTTPStatusError as e:
+        error(f"ipfs dag put failed: {e.response.text}")
     except Exception as e:
         error(f"Failed to store snapshot: {e}")
+    finally:
+        SNAPSHOT_FILE.unlink(missing_ok=True)
 
 def update_index_pointer(pointer: Dict[str, Any], snapshot_cid: str, seq: int, timestamp: str, total_count: int):
-    """Update index pointer with new snapshot metadata."""
+    """
+    Record the new snapshot in the index pointer.
+
+    Only the snapshot fields are written: the event fields (event_head,
+    event_count, total_count) belong to the API's event worker and may have
+    moved on since the build started. In-process builds merge through the
+    API's pointer module (_pointer_updater, see --defer-pointer); plain CLI
+    builds re-read the pointer from MFS just before writing it back.
+    """
     log("Updating index pointer...")
 
-    # Preserve event_head and event_count
-    new_pointer = {
-        "schema": "arke/index-pointer@v2",
-        "event_head": pointer.get("event_head"),
-        "event_count": pointer.get("event_count", 0),
+    fields = {
         "latest_snapshot_cid": snapshot_cid,
         "snapshot_event_cid": pointer.get("event_head"),
         "snapshot_seq": seq,
         "snapshot_count": total_count,
-        "snapshot_ts": timestamp,
-        "total_count": total_count,
-        "last_updated": timestamp
+        "snapshot_ts": timestamp
     }
 
+    if _pointer_updater is not None:
+        _pointer_updater(fields)
+        success("Index pointer updated")
+        return
+
+    # Merge into the latest pointer (fall back to the one read at build start)
+    new_pointer = dict(get_index_pointer() or pointer)
+    new_pointer.update(fields)
+    new_pointer["schema"] = "arke/index-pointer@v2"
+    new_pointer["last_updated"] = timestamp
+
     # Write to MFS
-    with httpx.Client(timeout=600.0) as client:  # Long timeout for large operations
-        response = client.post(
-            f"{IPFS_API}/files/write",
-            params={
-                "arg": INDEX_POINTER_PATH,
-                "create": "true",
-                "truncate": "true",
-                "parents": "true"
-            },
-            files={"file": ("pointer.json", json.dumps(new_pointer).encode(), "application/json")}
-        )
-        response.raise_for_status()
+    client = get_http_client()
+    response = client.post(
+        f"{IPFS_API}/files/write",
+        params={
+            "arg": INDEX_POINTER_PATH,
+            "create": "true",
+            "truncate": "true",
+            "parents": "true"
+        },
+        files={"file": ("pointer.json", orjson.dumps(new_pointer), "application/json")},
+        timeout=600.0  # Long timeout for large operations
+    )
+    response.raise_for_status()
 
     success("Index pointer updated")
 
@@ -689,18 +868,49 @@ def save_metadata(snapshot_cid: str, seq: int, timestamp: str, total_count: int)
         "count": total_count
     }
 
-    # Save versioned and latest
-    (SNAPSHOTS_DIR / f"snapshot-{seq}.json").write_text(json.dumps(metadata, indent=2))
-    (SNAPSHOTS_DIR / "latest.json").write_text(json.dumps(metadata, indent=2))
+    # Save versioned, then point latest at the same file (encoded once)
+    data = orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
+    versioned = SNAPSHOTS_DIR / f"snapshot-{seq}.json"
+    latest = SNAPSHOTS_DIR / "latest.json"
+    versioned.write_bytes(data)
+
+    # Hard link under a temp name, then rename over latest (atomic swap)
+    tmp_link = SNAPSHOTS_DIR / "latest.json.tmp"
+    try:
+        tmp_link.unlink(missing_ok=True)
+        os.link(versioned, tmp_link)
+        os.replace(tmp_link, latest)
+    except OSError:
+        # Filesystem without hard links
+        latest.write_bytes(data)
 
     success("Snapshot metadata saved")
 
-def main():
+def run_snapshot(log_stream=None, pointer_updater=None) -> Optional[str]:
+    """
+    Build, store and record a new snapshot.
+
+    Importable entry point; main() wraps it for CLI runs, which is also how
+    the API scheduler runs it (in a child process).
+
+    Args:
+        log_stream: Text stream for progress output (default: stderr)
+        pointer_updater: Optional callable that records the snapshot fields
+            in the index pointer instead of writing it to MFS directly
+
+    Returns:
+        The new snapshot CID, or None if there were no new events.
+        Fatal errors raise SystemExit via error().
+    """
+    global _log_stream, _pointer_updater
+    _log_stream = log_stream or sys.stderr
+    _pointer_updater = pointer_updater
     start_time = time.time()
 
-    try:
-        check_lock()
+    # Outside the try: a lock held by another build must not be cleaned up
+    check_lock()
 
+    try:
         # Get current state
         pointer = get_index_pointer()
         event_head = pointer.get("event_head")
@@ -728,6 +938,7 @@ def main():
 
         # Variables for append-only proof
         prev_all_cids = set()
+        prev_sorted_cids = None  # Previous snapshot's all_cids list (sorted)
         modified_pis = None  # None means full walk needed
 
         # Decide: incremental or full traversal
@@ -735,7 +946,7 @@ def main():
             if event_head == prev_event_cid:
                 log("No new events since last snapshot - skipping build")
                 cleanup_lock()
-                return
+                return None
 
             log(f"Mode: INCREMENTAL (from snapshot seq {prev_seq})")
             log(f"Previous snapshot: {prev_snapshot_cid[:16]}...")
@@ -743,19 +954,13 @@ def main():
 
             # Load previous entries and CIDs as baseline
             prev_entries, prev_snapshot, prev_all_cids = load_previous_snapshot(prev_snapshot_cid)
+            prev_sorted_cids = prev_snapshot.get("all_cids") or None
 
             # Walk only new events
-            events_processed, pis_modified_count = walk_event_chain_incremental(
+            events_processed, modified_pis, entries = walk_event_chain_incremental(
                 event_head, prev_event_cid, prev_entries, CHECKPOINT_FILE
             )
-
-            # Get the set of modified PIs for incremental CID collection
-            # Re-read checkpoint to get the modified PIs
-            modified_pis = set()
-            with open(CHECKPOINT_FILE) as f:
-                for line in f:
-                    entry = json.loads(line)
-                    modified_pis.add(entry.get("pi"))
+            pis_modified_count = len(modified_pis)
 
             total_count = len(prev_entries)
 
@@ -783,11 +988,17 @@ def main():
         log("PHASE 2: Collecting CIDs for append-only proof")
         log("=" * 60)
 
-        # Read entries from checkpoint file
-        entries = []
-        with open(CHECKPOINT_FILE) as f:
-            for line in f:
-                entries.append(json.loads(line))
+        if modified_pis is None:
+            # Read entries from checkpoint file (once; also used for the
+            # snapshot body). The incremental walk already returned its
+            # entries in memory, so only a full walk needs the re-read.
+            entries = []
+            with open(CHECKPOINT_FILE, 'rb', buffering=CHECKPOINT_BUFFER) as f:
+                for line in f:
+                    entries.append(orjson.loads(line))
+
+            # A full walk writes newest first; reverse in place, no copy
+            entries.reverse()
 
         # Collect all CIDs (incremental if we have previous CIDs)
         all_cids = collect_all_cids(
@@ -803,11 +1014,12 @@ def main():
         log("=" * 60)
 
         snapshot = build_snapshot_json(
-            CHECKPOINT_FILE, pointer, new_seq, timestamp, total_count,
+            entries, pointer, new_seq, timestamp, total_count,
             all_cids=all_cids,
-            prev_all_cids=prev_all_cids if prev_all_cids else None
+            prev_all_cids=prev_all_cids if prev_all_cids else None,
+            prev_sorted_cids=prev_sorted_cids
         )
-        snapshot_cid = store_snapshot_ipfs_cli(snapshot)
+        snapshot_cid = store_snapshot_ipfs(snapshot)
 
         # Phase 4: Update metadata
         log("")
@@ -823,22 +1035,21 @@ def main():
         merkle_root = snapshot.get("merkle_root", "N/A")
         cid_count = snapshot.get("cid_count", 0)
 
-        print("", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        print(f"{GREEN}Snapshot Build Complete{NC}", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        print(f"CID:         {snapshot_cid}", file=sys.stderr)
-        print(f"Sequence:    {new_seq}", file=sys.stderr)
-        print(f"Entities:    {total_count}", file=sys.stderr)
-        print(f"Total CIDs:  {cid_count}", file=sys.stderr)
-        print(f"Merkle Root: {merkle_root[:32]}..." if merkle_root != "N/A" else "Merkle Root: N/A", file=sys.stderr)
-        print(f"Time:        {timestamp}", file=sys.stderr)
-        print(f"Duration:    {elapsed:.0f}s ({elapsed/60:.1f} minutes)", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        print("", file=sys.stderr)
-
-        # Output CID to stdout (for scripting)
-        print(snapshot_cid)
+        print("", file=_log_stream)
+        print("=" * 60, file=_log_stream)
+        print(f"{GREEN}Snapshot Build Complete{NC}", file=_log_stream)
+        print("=" * 60, file=_log_stream)
+        print(f"CID:         {snapshot_cid}", file=_log_stream)
+        print(f"Sequence:    {new_seq}", file=_log_stream)
+        print(f"Entities:    {total_count}", file=_log_stream)
+        print(f"Total CIDs:  {cid_count}", file=_log_stream)
+        print(f"Merkle Root: {merkle_root[:32]}..." if merkle_root != "N/A" else "Merkle Root: N/A", file=_log_stream)
+        print(f"Time:        {timestamp}", file=_log_stream)
+        print(f"Duration:    {elapsed:.0f}s ({elapsed/60:.1f} minutes)", file=_log_stream)
+        print("=" * 60, file=_log_stream)
+        print("", file=_log_stream)
+
+        return snapshot_cid
 
     except KeyboardInterrupt:
         warn("Interrupted by user")
@@ -847,6 +1058,24 @@ def main():
         error(f"Unexpected error: {e}")
     finally:
         cleanup_lock()
+        _log_stream = sys.stderr
+        _pointer_updater = None
+
+def main():
+    # --defer-pointer: leave the index pointer alone and print the snapshot
+    # fields as JSON on stdout instead (the API scheduler merges them itself)
+    if "--defer-pointer" in sys.argv[1:]:
+        fields: Dict[str, Any] = {}
+        run_snapshot(pointer_updater=fields.update)
+        if fields:
+            print(orjson.dumps(fields).decode())
+        return
+
+    snapshot_cid = run_snapshot()
+
+    # Output CID to stdout (for scripting)
+    if snapshot_cid:
+        print(snapshot_cid)
 
 if __name__ == "__main__":
     main()
@@ -13,19 +13,33 @@ Uses ipfs dag export with explicit CID list to ensure completeness.
 
 import sys
 import json
+import orjson
 import os
+import configparser
 import subprocess
+import tempfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Set, Dict, Any
+from typing import Optional, Set, Dict, Any, List
 import httpx
 
 # Configuration
 IPFS_API = os.getenv("IPFS_API_URL", "http://localhost:5001/api/v0")
+IPFS_UDS_PATH = os.getenv("IPFS_UDS_PATH")  # Kubo API Unix socket (TCP to IPFS_API if unset)
 SNAPSHOTS_DIR = Path(os.getenv("SNAPSHOTS_DIR", "./snapshots"))
 BACKUPS_DIR = Path(os.getenv("BACKUPS_DIR", "./backups"))
 CONTAINER_NAME = os.getenv("CONTAINER_NAME", "ipfs-node")
 TIMEOUT = 30.0
+FETCH_WORKERS = int(os.getenv("CAR_FETCH_WORKERS", "16"))  # Concurrent dag/gets per batch
+
+# S3 multipart tuning for large CARs (aws CLI defaults: 10 parallel 8MB parts)
+S3_MAX_CONCURRENT_REQUESTS = os.getenv("S3_MAX_CONCURRENT_REQUESTS", "64")
+S3_MULTIPART_CHUNKSIZE = os.getenv("S3_MULTIPART_CHUNKSIZE", "64MB")
+S3_MIN_UPLOAD_RATE = 10 * 1024 * 1024  # Bytes/sec assumed when sizing the upload timeout
+
+# Shared keep-alive client (one connection pool for every dag/get)
+_http_client: Optional[httpx.Client] = None
 
 # Colors
 BLUE = '\033[0;34m'
@@ -47,45 +61,87 @@ def error(msg: str):
     print(f"{RED}[ERROR]{NC} {msg}", file=sys.stderr)
     sys.exit(1)
 
-def dag_get(cid: str) -> Dict[str, Any]:
-    """Fetch DAG object from IPFS."""
-    with httpx.Client(timeout=TIMEOUT) as client:
-        response = client.post(
-            f"{IPFS_API}/dag/get",
-            params={"arg": cid}
+def get_http_client() -> httpx.Client:
+    """Get or create the shared HTTP client (pool sized for fetch workers)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        # One extra connection for the concurrent event-chain walk
+        limits = httpx.Limits(
+            max_connections=FETCH_WORKERS + 1,
+            max_keepalive_connections=FETCH_WORKERS + 1
         )
-        response.raise_for_status()
-        return response.json()
-
-def walk_manifest_versions(manifest_cid: str) -> Set[str]:
-    """Walk manifest version chain and collect all CIDs + components."""
-    cids = set()
-    current = manifest_cid
+        _http_client = httpx.Client(
+            timeout=TIMEOUT,
+            transport=httpx.HTTPTransport(uds=IPFS_UDS_PATH, limits=limits)
+        )
+    return _http_client
 
-    while current:
-        cids.add(current)
+def link_cid(value: Any) -> Optional[str]:
+    """CID from a dag-json link ({"/": cid}) or a bare CID string; None if absent."""
+    if type(value) is dict:
+        return value.get("/") or None
+    return value or None
 
+def dag_get(cid: str) -> Dict[str, Any]:
+    """Fetch DAG object from IPFS."""
+    response = get_http_client().post(
+        f"{IPFS_API}/dag/get",
+        params={"arg": cid}
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def batch_dag_get(cids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch many DAG objects concurrently over the shared connection pool.
+    Returns {cid: object}; CIDs that fail to fetch are logged and omitted.
+    """
+    def fetch(cid: str):
         try:
-            manifest = dag_get(current)
+            return dag_get(cid)
+        except Exception as e:
+            warn(f"Failed to fetch manifest {cid[:16]}: {e}")
+            return None
 
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        objects = pool.map(fetch, cids)
+        return {cid: obj for cid, obj in zip(cids, objects) if obj is not None}
+
+def walk_manifest_versions(tip_cids: Set[str]) -> Set[str]:
+    """
+    Walk the version chains of many manifests and collect all CIDs + components.
+
+    Breadth-first: every tip is fetched in one concurrent batch, then every
+    prev manifest of that batch in the next, so the number of round-trip
+    waits is the longest version chain rather than the total manifest count.
+    """
+    cids = set()
+    walked = set()  # Manifests already fetched (cids also holds components)
+    frontier = list(tip_cids)
+    depth = 0
+
+    while frontier:
+        cids.update(frontier)
+        walked.update(frontier)
+        manifests = batch_dag_get(frontier)
+        depth += 1
+
+        next_frontier = set()
+        for manifest in manifests.values():
             # Collect component CIDs
             components = manifest.get("components", {})
-            for comp_cid_obj in components.values():
-                if isinstance(comp_cid_obj, dict) and "/" in comp_cid_obj:
-                    cids.add(comp_cid_obj["/"])
-                elif isinstance(comp_cid_obj, str):
-                    cids.add(comp_cid_obj)
-
-            # Move to previous version
-            prev = manifest.get("prev")
-            if prev:
-                current = prev.get("/") if isinstance(prev, dict) else prev
-            else:
-                break
+            for comp_link in components.values():
+                comp_cid = link_cid(comp_link)
+                if comp_cid:
+                    cids.add(comp_cid)
 
-        except Exception as e:
-            warn(f"Failed to fetch manifest {current[:16]}: {e}")
-            break
+            # Queue previous version (shared or cyclic history is walked once)
+            prev = link_cid(manifest.get("prev"))
+            if prev and prev not in walked:
+                next_frontier.add(prev)
+
+        log(f"  Version depth {depth}: {len(manifests)} manifests ({len(cids)} CIDs so far)")
+        frontier = list(next_frontier)
 
     return cids
 
@@ -101,11 +157,7 @@ def walk_event_chain(event_head: str) -> Set[str]:
             event = dag_get(current)
 
             # Move to previous event
-            prev = event.get("prev")
-            if prev:
-                current = prev.get("/") if isinstance(prev, dict) else prev
-            else:
-                break
+            current = link_cid(event.get("prev"))
 
         except Exception as e:
             warn(f"Failed to fetch event {current[:16]}: {e}")
@@ -133,24 +185,26 @@ def collect_all_cids(snapshot_cid: str) -> Dict[str, Set[str]]:
     entries = snapshot.get("entries", [])
     log(f"Processing {len(entries)} entries...")
 
-    for i, entry in enumerate(entries):
-        if (i + 1) % 100 == 0:
-            log(f"  Processed {i + 1}/{len(entries)} entries...")
+    tip_cids = set()
+    for entry in entries:
+        # Get tip CID (entries without one have no version history)
+        tip_cid = link_cid(entry.get("tip_cid"))
+        if tip_cid:
+            tip_cids.add(tip_cid)
 
-        # Get tip CID
-        tip_cid = entry.get("tip_cid", {})
-        if isinstance(tip_cid, dict) and "/" in tip_cid:
-            tip_cid = tip_cid["/"]
+    # The event chain is a linked list walked one dag/get at a time, so run
+    # it in the background while the manifest batches are fetched
+    with ThreadPoolExecutor(max_workers=1) as events_pool:
+        event_cid = snapshot.get("event_cid")
+        events_future = events_pool.submit(walk_event_chain, event_cid) if event_cid else None
 
-        # Walk version history (includes components)
+        # Walk version history (includes components), one batch per version depth
         # All manifests and components are now dag-cbor (bafyrei...)
-        version_cids = walk_manifest_versions(tip_cid)
-        cids["dag_nodes"].update(version_cids)
+        cids["dag_nodes"] = walk_manifest_versions(tip_cids)
 
-    # Collect event chain
-    event_cid = snapshot.get("event_cid")
-    if event_cid:
-        cids["events"] = walk_event_chain(event_cid)
+        # Collect event chain
+        if events_future:
+            cids["events"] = events_future.result()
 
     # Summary
     total = sum(len(s) for s in cids.values())
@@ -174,14 +228,17 @@ def export_car(snapshot_cid: str, all_cids: Set[str], output_path: Path) -> int:
     log(f"Expected CIDs: {len(all_cids)} (snapshot + manifests + components + events)")
 
     # Export from snapshot root (will follow all IPLD links)
+    # The child writes straight to the file's descriptor - no bytes pass
+    # through this process
     try:
-        result = subprocess.run(
-            ["docker", "exec", CONTAINER_NAME, "ipfs", "dag", "export",
-             "--progress=false", snapshot_cid],
-            stdout=open(output_path, 'wb'),
-            stderr=subprocess.PIPE,
-            timeout=3600  # 1 hour for large datasets
-        )
+        with open(output_path, 'wb') as out:
+            result = subprocess.run(
+                ["docker", "exec", CONTAINER_NAME, "ipfs", "dag", "export",
+                 "--progress=false", snapshot_cid],
+                stdout=out,
+                stderr=subprocess.PIPE,
+                timeout=3600  # 1 hour for large datasets
+            )
 
         if result.returncode != 0:
             error(f"CAR export failed: {result.stderr.decode()}")
@@ -206,7 +263,7 @@ def get_latest_snapshot() -> Dict[str, Any]:
     if not latest_file.exists():
         error(f"No snapshot found at {latest_file}")
 
-    return json.loads(latest_file.read_text())
+    return orjson.loads(latest_file.read_bytes())
 
 def get_instance_id() -> str:
     """Get EC2 instance ID from metadata service, or 'local' if not on EC2."""
@@ -223,6 +280,40 @@ def get_instance_id() -> str:
         pass
     return "local"
 
+def s3_transfer_config() -> Optional[str]:
+    """
+    Write an aws CLI config with the multipart tuning applied; return its path.
+
+    The aws CLI reads these settings only from its config file, so they go
+    into a private copy of the operator's config (other profiles may be
+    referenced by the active one, e.g. source_profile) with an s3 block on
+    the active AWS_PROFILE, used via AWS_CONFIG_FILE; ~/.aws/config is never
+    modified. The copy is a 0600 temp file the caller removes after the
+    upload. Returns None (CLI defaults) if it cannot be written.
+    """
+    profile = os.getenv("AWS_PROFILE", "default")
+    section = "default" if profile == "default" else f"profile {profile}"
+
+    try:
+        config = configparser.RawConfigParser()
+        config.read(os.path.expanduser(os.getenv("AWS_CONFIG_FILE", "~/.aws/config")))
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, "s3", (
+            f"\nmax_concurrent_requests = {S3_MAX_CONCURRENT_REQUESTS}"
+            f"\nmultipart_chunksize = {S3_MULTIPART_CHUNKSIZE}"
+        ))
+
+        # mkstemp creates the file 0600
+        fd, path = tempfile.mkstemp(prefix="arke-s3-", suffix=".config")
+        with os.fdopen(fd, 'w') as f:
+            config.write(f)
+    except (OSError, configparser.Error) as e:
+        warn(f"Could not write S3 transfer config (using aws CLI defaults): {e}")
+        return None
+
+    return path
+
 def upload_to_s3(car_path: Path, metadata_path: Path, seq: int) -> bool:
     """Upload CAR file and metadata to S3 with instance-specific folder structure.
 
@@ -260,16 +351,24 @@ def upload_to_s3(car_path: Path, metadata_path: Path, seq: int) -> bool:
             warn(f"S3 bucket {bucket_name} does not exist - skipping upload")
             return False
 
-        # Upload CAR file
+        # Upload CAR file (multipart, many parts in flight)
         upload_date = datetime.now().strftime("%Y-%m-%d")
         s3_car_path = f"s3://{bucket_name}/{s3_prefix}{car_path.name}"
+        upload_timeout = max(300, car_path.stat().st_size // S3_MIN_UPLOAD_RATE)
 
-        result = subprocess.run([
-            "aws", "s3", "cp", str(car_path), s3_car_path,
-            "--region", "us-east-1",
-            "--storage-class", "STANDARD",
-            "--metadata", f"source=arke-ipfs-ec2,backup-type=automated,upload-date={upload_date},instance-id={instance_id},sequence={seq}"
-        ], capture_output=True, text=True, timeout=300)
+        s3_config = s3_transfer_config()
+        try:
+            result = subprocess.run([
+                "aws", "s3", "cp", str(car_path), s3_car_path,
+                "--region", "us-east-1",
+                "--storage-class", "STANDARD",
+                "--metadata", f"source=arke-ipfs-ec2,backup-type=automated,upload-date={upload_date},instance-id={instance_id},sequence={seq}",
+                "--no-progress"
+            ], capture_output=True, text=True, timeout=upload_timeout,
+               env={**os.environ, "AWS_CONFIG_FILE": s3_config} if s3_config else None)
+        finally:
+            if s3_config:
+                os.unlink(s3_config)
 
         if result.returncode != 0:
             warn(f"S3 CAR upload failed: {result.stderr}")
@@ -282,7 +381,8 @@ def upload_to_s3(car_path: Path, metadata_path: Path, seq: int) -> bool:
             s3_metadata_path = f"s3://{bucket_name}/{s3_prefix}{metadata_path.name}"
             result = subprocess.run([
                 "aws", "s3", "cp", str(metadata_path), s3_metadata_path,
-                "--region", "us-east-1"
+                "--region", "us-east-1",
+                "--no-progress"
             ], capture_output=True, text=True, timeout=60)
 
             if result.returncode == 0:
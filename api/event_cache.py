@@ -0,0 +1,35 @@
+"""
+In-process LRU cache of decoded events, keyed by CID.
+
+Events are content-addressed and immutable, so entries never go stale -
+eviction is purely by recency. The event worker adds each event it
+writes, so the newest pages of the chain are served without any Kubo
+round trips; chain reads add whatever they fetch.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+
+EVENT_CACHE_SIZE = 10_000
+_cache: OrderedDict[str, dict] = OrderedDict()
+
+
+def get(cid: str) -> Optional[dict]:
+    """Return the cached event for `cid` (marking it recently used), or None."""
+    event_data = _cache.get(cid)
+    if event_data is not None:
+        _cache.move_to_end(cid)
+    return event_data
+
+
+def contains(cid: str) -> bool:
+    """Check whether `cid` is cached, without touching its recency."""
+    return cid in _cache
+
+
+def put(cid: str, event_data: dict):
+    """Cache a decoded event (same shape as dag/get output)."""
+    _cache[cid] = event_data
+    _cache.move_to_end(cid)
+    if len(_cache) > EVENT_CACHE_SIZE:
+        _cache.popitem(last=False)
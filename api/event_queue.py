@@ -7,40 +7,28 @@ and improves throughput by batching IPFS writes.
 """
 
 import asyncio
-import httpx
 from datetime import datetime, timezone
 from typing import Optional
-from config import settings
-from models import Event
+from config import BLOCK_PUT_URL, PIN_ADD_URL
+from timestamps import utc_now_iso
 import index_pointer
-import json
+import event_cache
+from ipfs_client import ipfs_post
+import orjson
+import dag_cbor
 
 # Queue configuration
 BATCH_SIZE = 50           # Max events per batch
 BATCH_TIMEOUT_MS = 500    # Max wait before processing partial batch (ms)
+PIN_ATTEMPTS = 3          # pin/add attempts per batch before deferring
+
+EVENT_SCHEMA = "arke/event@v1"
 
 # Global state
 _event_queue: asyncio.Queue[dict] = asyncio.Queue()
 _worker_task: Optional[asyncio.Task] = None
 _shutdown_event: asyncio.Event = asyncio.Event()
-
-# Shared HTTP client for connection pooling
-_http_client: Optional[httpx.AsyncClient] = None
-
-
-async def _get_http_client() -> httpx.AsyncClient:
-    """Get or create shared HTTP client with proper timeouts."""
-    global _http_client
-    if _http_client is None or _http_client.is_closed:
-        _http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(
-                connect=5.0,
-                read=30.0,
-                write=30.0,
-                pool=5.0
-            )
-        )
-    return _http_client
+_unpinned: list[str] = []  # Accepted event CIDs whose pin failed; retried with the next batch
 
 
 async def start_worker():
@@ -53,7 +41,7 @@ async def start_worker():
 
 async def stop_worker():
     """Stop the worker and flush remaining events."""
-    global _worker_task, _http_client
+    global _worker_task
 
     queue_size = _event_queue.qsize()
     if queue_size > 0:
@@ -71,11 +59,6 @@ async def stop_worker():
             print(f"⚠️ Worker shutdown timeout, {_event_queue.qsize()} events may be lost")
             _worker_task.cancel()
 
-    # Close HTTP client
-    if _http_client and not _http_client.is_closed:
-        await _http_client.aclose()
-        _http_client = None
-
 
 async def enqueue_event(event_type: str, pi: str, ver: int, tip_cid: str) -> dict:
     """
@@ -87,7 +70,7 @@ async def enqueue_event(event_type: str, pi: str, ver: int, tip_cid: str) -> dic
         "pi": pi,
         "ver": ver,
         "tip_cid": tip_cid,
-        "ts": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        "ts": utc_now_iso(),
         "queued_at": datetime.now(timezone.utc).isoformat()
     }
 
@@ -126,6 +109,13 @@ async def _event_worker():
             deadline = asyncio.get_event_loop().time() + (BATCH_TIMEOUT_MS / 1000)
 
             while len(batch) < BATCH_SIZE:
+                # Drain already-queued events without a wait_for per event
+                try:
+                    batch.append(_event_queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
                 remaining = deadline - asyncio.get_event_loop().time()
                 if remaining <= 0:
                     break
@@ -160,65 +150,138 @@ async def _event_worker():
     print("📋 Event worker finished")
 
 
-async def _process_batch(batch: list[dict]):
-    """Process a batch of events, writing them all to IPFS."""
-    start_time = datetime.now(timezone.utc)
-
-    try:
-        # Get current pointer
-        pointer = await index_pointer.get_index_pointer()
-        current_head = pointer.event_head
+async def _put_block(cid: str, block: bytes):
+    """Store an unpinned dag-cbor block, checking Kubo agrees on its CID."""
+    response = await ipfs_post(
+        BLOCK_PUT_URL,
+        params={
+            "cid-codec": "dag-cbor",
+            "mhtype": "sha2-256",
+            "pin": "false"
+        },
+        files={"file": ("event.cbor", block, "application/cbor")},
+    )
+    response.raise_for_status()
 
-        client = await _get_http_client()
-        events_written = 0
+    stored_cid = orjson.loads(response.content)["Key"]
+    if stored_cid != cid:
+        raise ValueError(f"CID mismatch: expected {cid}, Kubo stored {stored_cid}")
 
-        for event_data in batch:
-            try:
-                # Create event object with prev pointer
-                event = Event(
-                    type=event_data["type"],
-                    pi=event_data["pi"],
-                    ver=event_data["ver"],
-                    tip_cid={"/": event_data["tip_cid"]},
-                    ts=event_data["ts"],
-                    prev={"/": current_head} if current_head else None
-                )
 
-                # Write to IPFS
-                response = await client.post(
-                    f"{settings.IPFS_API_URL}/dag/put",
-                    params={
-                        "store-codec": "dag-cbor",
-                        "input-codec": "json",
-                        "pin": "true"
-                    },
-                    files={"file": ("event.json", event.model_dump_json().encode(), "application/json")},
-                )
-                response.raise_for_status()
+async def _pin_blocks(cids: list[str]) -> bool:
+    """
+    Pin the accepted event blocks in one request (direct pins).
 
-                # Get new CID
-                result = json.loads(response.text.strip())
-                new_cid = result["Cid"]["/"]
+    Retries a few times; on failure the CIDs are kept in _unpinned and pinned
+    with the next batch. Returns True if everything outstanding was pinned.
+    """
+    to_pin = _unpinned + cids
+    for attempt in range(1, PIN_ATTEMPTS + 1):
+        try:
+            response = await ipfs_post(
+                PIN_ADD_URL,
+                params=[("arg", cid) for cid in to_pin] + [("recursive", "false")],
+            )
+            response.raise_for_status()
+            _unpinned.clear()
+            return True
+        except Exception as e:
+            print(f"⚠️ Failed to pin {len(to_pin)} events (attempt {attempt}/{PIN_ATTEMPTS}): {e}")
+            if attempt < PIN_ATTEMPTS:
+                await asyncio.sleep(0.5 * attempt)
 
-                # Update running state
-                current_head = new_cid
-                pointer.event_count += 1
-                if event_data["type"] == "create":
-                    pointer.total_count += 1
+    _unpinned[:] = to_pin
+    return False
 
-                events_written += 1
 
-            except Exception as e:
-                print(f"⚠️ Failed to write event (pi={event_data['pi']}): {e}")
-                # Continue with next event in batch
+async def _process_batch(batch: list[dict]):
+    """Process a batch of events, writing them all to IPFS."""
+    start_time = datetime.now(timezone.utc)
 
-        # Update pointer once for whole batch
-        if events_written > 0:
-            pointer.event_head = current_head
-            await index_pointer.update_index_pointer(pointer)
+    try:
+        # Hold the pointer from read to write (snapshot builds merge into it)
+        async with index_pointer.pointer_lock:
+            # Get current pointer
+            pointer = await index_pointer.get_index_pointer()
+            current_head = pointer.event_head
+
+            events_written = 0
+
+            # CIDs are computed locally, so the whole batch can be linked up front
+            # and its blocks written concurrently instead of one RTT per event.
+            # If a write fails, the chain is re-linked from the last good event
+            # and the rest of the batch is retried. Blocks are written unpinned
+            # and only the accepted chain is pinned, so blocks orphaned by a
+            # re-link are left for GC.
+            accepted = []
+            pending = batch
+            while pending:
+                blocks = []
+                prev_cid = current_head
+                for event_data in pending:
+                    # Build event (arke/event@v1) with prev pointer. Fields were
+                    # validated at the API boundary (models.AppendEventRequest),
+                    # so encode directly; tip_cid and prev are {"/": cid} links.
+                    event = {
+                        "schema": EVENT_SCHEMA,
+                        "type": event_data["type"],
+                        "pi": event_data["pi"],
+                        "ver": event_data["ver"],
+                        "tip_cid": {"/": event_data["tip_cid"]},
+                        "ts": event_data["ts"],
+                        "prev": {"/": prev_cid} if prev_cid else None
+                    }
+                    block = dag_cbor.encode(event)
+                    prev_cid = dag_cbor.cid_for(block)
+                    blocks.append((prev_cid, block, event))
+
+                results = await asyncio.gather(
+                    *(_put_block(cid, block) for cid, block, _ in blocks),
+                    return_exceptions=True
+                )
 
-        elapsed_ms = (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
-        print(f"✅ Batch: {events_written}/{len(batch)} events in {elapsed_ms:.0f}ms")
+                failed_at = None
+                mismatch = False
+                for i, (event_data, result) in enumerate(zip(pending, results)):
+                    if isinstance(result, ValueError):
+                        # The local encoder disagrees with Kubo: every retry would
+                        # fail the same way, so stop here
+                        print(f"❌ Event CID mismatch (pi={event_data['pi']}), dropping {len(pending) - i} events: {result}")
+                        print("❌ Local dag-cbor encoding is out of sync with Kubo (see scripts/test_dag_cbor.py)")
+                        failed_at = i
+                        mismatch = True
+                        break
+                    if isinstance(result, Exception):
+                        print(f"⚠️ Failed to write event (pi={event_data['pi']}): {result}")
+                        failed_at = i
+                        break
+
+                    # Update running state (and keep the new event hot for readers)
+                    current_head, _, event = blocks[i]
+                    accepted.append(current_head)
+                    event_cache.put(current_head, event)
+                    pointer.event_count += 1
+                    if event_data["type"] == "create":
+                        pointer.total_count += 1
+                    events_written += 1
+
+                # Drop the failed event and re-link everything after it
+                if failed_at is None or mismatch:
+                    pending = []
+                else:
+                    pending = pending[failed_at + 1:]
+
+            # Pin and update pointer once for whole batch. The blocks are
+            # already stored, so a failed pin must not lose the batch: the
+            # pointer still advances and the pin is retried with the next batch.
+            if events_written > 0:
+                if not await _pin_blocks(accepted):
+                    print(f"⚠️ {len(_unpinned)} accepted events left unpinned, retrying with the next batch")
+                pointer.event_head = current_head
+                await index_pointer.update_index_pointer(pointer)
+
+            elapsed_ms = (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
+            print(f"✅ Batch: {events_written}/{len(batch)} events in {elapsed_ms:.0f}ms")
 
     except Exception as e:
         print(f"❌ Batch processing failed: {e}")
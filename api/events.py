@@ -6,16 +6,83 @@ then batch-processed by a background worker.
 """
 
 import httpx
-from datetime import datetime, timezone
-from config import settings
+from typing import Optional
+from config import DAG_GET_URL
+from timestamps import utc_now_iso
 import index_pointer
+import event_cache
+from ipfs_client import ipfs_post
 import asyncio
-import subprocess
+import orjson
+import sys
 from pathlib import Path
 
 # Import queue functions
 import event_queue
 
+# Scheduled snapshot build currently running (child process started here)
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+# Chain reads are small; fail fast rather than queue behind a stuck Kubo
+_read_timeout = httpx.Timeout(10.0, connect=2.0)
+
+
+async def _get_event(cid: str) -> dict:
+    """Fetch an event by CID, serving repeat lookups from the event cache."""
+    event_data = event_cache.get(cid)
+    if event_data is not None:
+        return event_data
+
+    response = await ipfs_post(
+        DAG_GET_URL,
+        params={"arg": cid},
+        timeout=_read_timeout
+    )
+    response.raise_for_status()
+    event_data = orjson.loads(response.content)
+
+    event_cache.put(cid, event_data)
+    return event_data
+
+
+# Speculative lookahead: after serving a page, warm the cache with the next
+# page in the background so the mirror's follow-up request is served from RAM.
+# Opportunistic only - skipped when too many prefetches are already running.
+PREFETCH_MAX_IN_FLIGHT = 8
+_prefetch_tasks: dict[str, asyncio.Task] = {}
+
+
+async def _prefetch_page(cursor: str, limit: int):
+    """Walk up to `limit` events from `cursor`, populating the event cache."""
+    current_cid = cursor
+    try:
+        for _ in range(limit):
+            event_data = await _get_event(current_cid)
+            if not event_data.get("prev"):
+                return
+            current_cid = event_data["prev"]["/"]
+    except Exception as e:
+        print(f"⚠️ Event prefetch from {cursor[:16]}... stopped: {e}")
+
+
+def _schedule_prefetch(cursor: str, limit: int):
+    """Start a background prefetch of the page beginning at `cursor`."""
+    if event_cache.contains(cursor) or cursor in _prefetch_tasks:
+        return
+    if len(_prefetch_tasks) >= PREFETCH_MAX_IN_FLIGHT:
+        return
+
+    task = asyncio.create_task(_prefetch_page(cursor, limit))
+    _prefetch_tasks[cursor] = task
+    task.add_done_callback(lambda _: _prefetch_tasks.pop(cursor, None))
+
+
+def cancel_prefetches():
+    """Cancel in-flight prefetches (called on app shutdown)."""
+    for task in list(_prefetch_tasks.values()):
+        task.cancel()
+
 
 async def append_event(event_type: str, pi: str, ver: int, tip_cid: str) -> dict:
     """
@@ -49,47 +116,45 @@ async def query_events(limit: int = 50, cursor: str | None = None) -> tuple[list
 
     Events are returned in reverse chronological order (newest first).
     Each event includes: event_cid, type, pi, ver, tip_cid, ts
-    """
-    pointer = await index_pointer.get_index_pointer()
 
-    # Start from cursor or head
-    current_cid = cursor or pointer.event_head
+    The cursor is the exact CID to resume from, so a page costs at most
+    `limit` dag/gets however deep into the chain it starts.
+    """
+    # Start from cursor or head (only read the pointer when needed)
+    current_cid = cursor
+    if not current_cid:
+        pointer = await index_pointer.get_index_pointer()
+        current_cid = pointer.event_head
 
     if not current_cid:
         return [], None
 
     events = []
 
-    async with httpx.AsyncClient() as client:
-        for _ in range(limit):
-            # Fetch event
-            response = await client.post(
-                f"{settings.IPFS_API_URL}/dag/get",
-                params={"arg": current_cid},
-                timeout=5.0
-            )
-            response.raise_for_status()
-            event_data = response.json()
-
-            # Add to results
-            events.append({
-                "event_cid": current_cid,
-                "type": event_data["type"],
-                "pi": event_data["pi"],
-                "ver": event_data["ver"],
-                "tip_cid": event_data["tip_cid"]["/"],
-                "ts": event_data["ts"]
-            })
-
-            # Move to previous
-            if not event_data.get("prev"):
-                # End of chain
-                return events, None
+    for _ in range(limit):
+        # Fetch event (cached - recent writes and re-read pages skip Kubo)
+        event_data = await _get_event(current_cid)
 
-            current_cid = event_data["prev"]["/"]
+        # Add to results
+        events.append({
+            "event_cid": current_cid,
+            "type": event_data["type"],
+            "pi": event_data["pi"],
+            "ver": event_data["ver"],
+            "tip_cid": event_data["tip_cid"]["/"],
+            "ts": event_data["ts"]
+        })
+
+        # Move to previous
+        if not event_data.get("prev"):
+            # End of chain
+            return events, None
+
+        current_cid = event_data["prev"]["/"]
 
-        # More events available
-        return events, current_cid
+    # More events available - warm the cache for the next page
+    _schedule_prefetch(current_cid, limit)
+    return events, current_cid
 
 
 def get_queue_stats() -> dict:
@@ -106,38 +171,45 @@ async def trigger_scheduled_snapshot():
     Triggered by scheduler every N minutes.
     Builds a snapshot if there are entities and no build is already in progress.
     """
-    # Check if lock file exists (snapshot already building)
-    lock_file = Path("/tmp/arke-snapshot.lock")
-    if lock_file.exists():
-        print("⏳ Snapshot build already in progress (lock file exists), skipping scheduled trigger")
+    global _snapshot_task
+
+    # Skip if a build started by this process is still running
+    if _snapshot_task and not _snapshot_task.done():
+        print("⏳ Snapshot build already in progress, skipping scheduled trigger")
         return
 
-    # Get current state
-    pointer = await index_pointer.get_index_pointer()
+    async with index_pointer.pointer_lock:
+        # Get current state
+        pointer = await index_pointer.get_index_pointer()
 
-    # Skip if no entities exist
-    if pointer.total_count == 0:
-        print("ℹ️  No entities to snapshot, skipping scheduled trigger")
-        return
+        # Skip if no entities exist
+        if pointer.total_count == 0:
+            print("ℹ️  No entities to snapshot, skipping scheduled trigger")
+            return
 
-    print(f"⏰ Scheduled snapshot trigger (total PIs: {pointer.total_count}, total events: {pointer.event_count})")
+        print(f"⏰ Scheduled snapshot trigger (total PIs: {pointer.total_count}, total events: {pointer.event_count})")
 
-    # Update trigger timestamp
-    trigger_time = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
-    pointer.last_snapshot_trigger = trigger_time
-    # Increase timeout for large datasets (31k+ entities)
-    await index_pointer.update_index_pointer(pointer, timeout=600.0)
+        # Update trigger timestamp
+        trigger_time = utc_now_iso()
+        pointer.last_snapshot_trigger = trigger_time
+        # Increase timeout for large datasets (31k+ entities)
+        await index_pointer.update_index_pointer(pointer, timeout=600.0)
 
     # Trigger snapshot build in background (fire-and-forget)
-    # Run in thread pool to avoid blocking async event loop
-    loop = asyncio.get_event_loop()
-    loop.run_in_executor(None, _run_snapshot_build, trigger_time, pointer.total_count, pointer.event_count)
+    _snapshot_task = asyncio.create_task(_run_snapshot_build(
+        trigger_time, pointer.total_count, pointer.event_count
+    ))
 
 
-def _run_snapshot_build(trigger_time: str, total_pis: int, total_events: int):
+async def _run_snapshot_build(trigger_time: str, total_pis: int, total_events: int):
     """
-    Run snapshot build in thread pool to avoid blocking async loop.
-    This calls the DR Python script directly.
+    Run the DR builder in a child process and record its snapshot.
+
+    A separate process keeps the build's CPU-heavy steps (decoding the
+    previous snapshot, CID set and sort work) off this process's GIL, and
+    its memory out of the API. The builder hands the snapshot fields back
+    (--defer-pointer) and they are merged here, serialized with the event
+    worker's pointer writes.
     """
     log_path = Path("/app/logs/snapshot-build.log")
     log_path.parent.mkdir(exist_ok=True)
@@ -149,15 +221,28 @@ def _run_snapshot_build(trigger_time: str, total_pis: int, total_events: int):
             log_file.write(f"Total PIs: {total_pis}\n")
             log_file.write(f"Total events: {total_events}\n")
             log_file.write(f"{'='*60}\n\n")
-
-            # Run build_snapshot.py as subprocess
-            subprocess.run(
-                ["python3", "-m", "dr.build_snapshot"],
-                stdout=log_file,
-                stderr=subprocess.STDOUT,
-                cwd="/app",
-                check=False  # Don't raise on error, just log
+            log_file.flush()
+
+            # Builder progress goes to the log; stdout carries the fields
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "dr.build_snapshot", "--defer-pointer",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=log_file,
+                cwd=Path(__file__).resolve().parent
             )
-        print(f"✅ Snapshot build completed (see {log_path})")
+            stdout, _ = await process.communicate()
+
+        if process.returncode != 0:
+            print(f"❌ Snapshot build failed (exit {process.returncode}, see {log_path})")
+            return
+
+        if stdout.strip():
+            await index_pointer.update_snapshot_fields(orjson.loads(stdout))
+            print(f"✅ Snapshot build completed (see {log_path})")
+        else:
+            print(f"ℹ️  No new events since last snapshot (see {log_path})")
     except Exception as e:
         print(f"❌ Snapshot build failed: {e}")
+    finally:
+        # Next read re-syncs with MFS
+        index_pointer.invalidate_index_pointer_cache()
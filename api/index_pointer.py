@@ -1,8 +1,12 @@
+import asyncio
 import httpx
-from datetime import datetime, timezone
-from config import settings
+import time
+from typing import Optional
+from config import settings, FILES_READ_URL, FILES_WRITE_URL
+from timestamps import utc_now_iso
 from models import IndexPointer
-import json
+from ipfs_client import ipfs_post
+import orjson
 
 # Explicit timeout configuration to prevent hanging on dead connections
 _default_timeout = httpx.Timeout(
@@ -12,18 +16,60 @@ _default_timeout = httpx.Timeout(
     pool=5.0        # Waiting for connection from pool
 )
 
-async def get_index_pointer() -> IndexPointer:
+# In-process copy of the index pointer (write-through). The event worker is the
+# only writer of the event head, so the cached copy is authoritative for it.
+# The age counts from the last MFS read, not the last write, so an external
+# writer (CLI snapshot build, restore) is seen within max age even under load.
+POINTER_CACHE_MAX_AGE = 1.0  # seconds
+_cached_pointer: Optional[IndexPointer] = None
+_cached_at: float = 0.0
+
+# Held across read-modify-write cycles of the pointer within this process
+pointer_lock = asyncio.Lock()
+
+
+def _set_cached_pointer(pointer: IndexPointer, from_read: bool):
+    global _cached_pointer, _cached_at
+    _cached_pointer = pointer.model_copy()
+    if from_read:
+        _cached_at = time.monotonic()
+
+
+def invalidate_index_pointer_cache():
+    """Drop the cached pointer so the next read goes to MFS."""
+    global _cached_pointer
+    _cached_pointer = None
+
+
+async def get_index_pointer(max_age: float = POINTER_CACHE_MAX_AGE) -> IndexPointer:
+    """Read index pointer, served from the in-process cache when fresh.
+
+    Args:
+        max_age: Maximum age in seconds of a cached pointer (0 forces an MFS read)
+
+    Returns a copy, so callers may mutate it before passing it to
+    update_index_pointer().
+    """
+    if _cached_pointer is not None and time.monotonic() - _cached_at < max_age:
+        return _cached_pointer.model_copy()
+
+    pointer = await _read_index_pointer()
+    _set_cached_pointer(pointer, from_read=True)
+    return pointer
+
+
+async def _read_index_pointer() -> IndexPointer:
     """Read index pointer from MFS."""
     try:
         # Try to read from MFS
-        async with httpx.AsyncClient(timeout=_default_timeout) as client:
-            response = await client.post(
-                f"{settings.IPFS_API_URL}/files/read",
-                params={"arg": settings.INDEX_POINTER_PATH},
-            )
-            response.raise_for_status()
-            data = response.json()
-            return IndexPointer(**data)
+        response = await ipfs_post(
+            FILES_READ_URL,
+            params={"arg": settings.INDEX_POINTER_PATH},
+            timeout=_default_timeout
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        return IndexPointer(**data)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 500:  # File doesn't exist
             # Initialize empty index pointer (v2 schema)
@@ -37,7 +83,7 @@ async def get_index_pointer() -> IndexPointer:
                 snapshot_ts=None,
                 total_count=0,
                 last_snapshot_trigger=None,
-                last_updated=datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+                last_updated=utc_now_iso()
             )
         raise
 
@@ -48,12 +94,12 @@ async def update_index_pointer(pointer: IndexPointer, timeout: float = 30.0):
         pointer: IndexPointer to write
         timeout: HTTP read timeout in seconds (default 30s, increase for large operations)
     """
-    pointer.last_updated = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    pointer.last_updated = utc_now_iso()
 
     # Convert to JSON
     data = pointer.model_dump_json()
 
-    # Use explicit timeout with connection limits
+    # Use explicit timeout (read/write scale with the operation)
     write_timeout = httpx.Timeout(
         connect=5.0,
         read=timeout,
@@ -61,16 +107,34 @@ async def update_index_pointer(pointer: IndexPointer, timeout: float = 30.0):
         pool=5.0
     )
 
-    async with httpx.AsyncClient(timeout=write_timeout) as client:
-        # Write to MFS
-        response = await client.post(
-            f"{settings.IPFS_API_URL}/files/write",
-            params={
-                "arg": settings.INDEX_POINTER_PATH,
-                "create": "true",
-                "truncate": "true",
-                "parents": "true"
-            },
-            files={"file": ("pointer.json", data.encode(), "application/json")},
-        )
-        response.raise_for_status()
+    # Write to MFS
+    response = await ipfs_post(
+        FILES_WRITE_URL,
+        params={
+            "arg": settings.INDEX_POINTER_PATH,
+            "create": "true",
+            "truncate": "true",
+            "parents": "true"
+        },
+        files={"file": ("pointer.json", data.encode(), "application/json")},
+        timeout=write_timeout
+    )
+    response.raise_for_status()
+
+    # Write-through: keep the cache in step with what MFS now holds
+    _set_cached_pointer(pointer, from_read=False)
+
+
+async def update_snapshot_fields(fields: dict, timeout: float = 600.0):
+    """Merge snapshot fields into the current pointer and write it.
+
+    Used by the scheduler to record a snapshot built in a child process. The event fields (event_head,
+    event_count, total_count) are left as the event worker wrote them, and
+    the lock keeps a batch in flight from writing back a copy without the
+    new snapshot fields.
+    """
+    async with pointer_lock:
+        pointer = await get_index_pointer(max_age=0)
+        for name, value in fields.items():
+            setattr(pointer, name, value)
+        await update_index_pointer(pointer, timeout=timeout)
@@ -0,0 +1,77 @@
+"""
+Shared connection pool for the Kubo HTTP RPC API.
+
+All async calls to Kubo go through one client with explicit pool limits,
+and through a semaphore that caps requests in flight, so bursts (a full
+event batch, mirror pagination, prefetches) queue here instead of
+thrashing the pool or overloading Kubo's HTTP server.
+
+When IPFS_UDS_PATH is set (Kubo's Addresses.API given an extra
+/unix/<path> entry on a shared volume), requests go over the Unix domain
+socket instead of TCP loopback. Request URLs are unchanged - the
+transport ignores the host part of IPFS_API_URL. The snapshot builder
+and export_car honor the same variable; keep the TCP API address as
+well, since the shell scripts (curl) and `docker exec ... ipfs` use it.
+"""
+
+import asyncio
+import httpx
+from typing import Optional
+from config import settings
+
+# Pool limits for the shared client
+MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 30.0  # seconds
+
+# Max concurrent requests to Kubo (kept below MAX_CONNECTIONS so callers
+# wait on the semaphore rather than hitting pool timeouts)
+MAX_IN_FLIGHT = 24
+
+# Default timeouts; call sites pass `timeout=` for slower operations
+_default_timeout = httpx.Timeout(
+    connect=5.0,
+    read=30.0,
+    write=30.0,
+    pool=5.0
+)
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore = asyncio.BoundedSemaphore(MAX_IN_FLIGHT)
+
+
+def make_transport(limits: httpx.Limits) -> httpx.AsyncHTTPTransport:
+    """Create a pooled transport to Kubo (UDS if configured, else TCP).
+
+    Pool limits must be set on the transport itself - httpx ignores the
+    client's `limits` argument when an explicit transport is passed.
+    """
+    return httpx.AsyncHTTPTransport(uds=settings.IPFS_UDS_PATH, limits=limits)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get or create the shared Kubo client."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=_default_timeout,
+            transport=make_transport(httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ))
+        )
+    return _client
+
+
+async def ipfs_post(url: str, **kwargs) -> httpx.Response:
+    """POST to a Kubo RPC endpoint through the shared, bounded client."""
+    async with _semaphore:
+        return await get_client().post(url, **kwargs)
+
+
+async def close_client():
+    """Close the shared client (called on app shutdown)."""
+    global _client
+    if _client and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -2,11 +2,13 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from config import settings
+from config import settings, DAG_GET_URL
 import index_pointer
 import events
 import event_queue
+import ipfs_client
 from models import AppendEventRequest
+import asyncio
 import httpx
 
 app = FastAPI(title="Arke IPFS Index API", version="1.0.0")
@@ -49,10 +51,20 @@ async def list_events(
     - next_cursor: Event CID for next page (or null)
     """
     try:
-        pointer = await index_pointer.get_index_pointer()
-
-        # Walk event chain
-        items, next_cursor = await events.query_events(limit=limit, cursor=cursor)
+        if cursor:
+            # Pointer read and chain walk are independent - run concurrently
+            pointer, (items, next_cursor) = await asyncio.gather(
+                index_pointer.get_index_pointer(),
+                events.query_events(limit=limit, cursor=cursor)
+            )
+        else:
+            # Walk starts at the head, so reuse the pointer we just read
+            pointer = await index_pointer.get_index_pointer()
+            items, next_cursor = [], None
+            if pointer.event_head:
+                items, next_cursor = await events.query_events(
+                    limit=limit, cursor=pointer.event_head
+                )
 
         return {
             "items": items,
@@ -97,12 +109,13 @@ async def get_latest_snapshot():
                 detail="No snapshot available yet. Create entities and trigger a snapshot first."
             )
 
-        # Stream the snapshot from Kubo
+        # Stream the snapshot from Kubo (own connection: a long download
+        # should not hold a slot in the shared request pool)
         async def stream_snapshot():
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=ipfs_client.make_transport(httpx.Limits())) as client:
                 async with client.stream(
                     "POST",
-                    f"{settings.IPFS_API_URL}/dag/get",
+                    DAG_GET_URL,
                     params={"arg": pointer.latest_snapshot_cid},
                     timeout=settings.SNAPSHOT_TIMEOUT_SECONDS
                 ) as response:
@@ -198,6 +211,10 @@ async def shutdown_event():
     # Stop event queue worker (flushes remaining events)
     await event_queue.stop_worker()
 
+    # Stop background prefetches, then close the shared Kubo client
+    events.cancel_prefetches()
+    await ipfs_client.close_client()
+
     # Stop scheduler
     if scheduler.running:
         scheduler.shutdown()
@@ -24,15 +24,6 @@ class IndexPointer(BaseModel):
     last_snapshot_trigger: Optional[str] = None  # Timestamp when snapshot was last triggered
     last_updated: str
 
-class Event(BaseModel):
-    schema: str = "arke/event@v1"
-    type: str  # "create" | "update"
-    pi: str
-    ver: int
-    tip_cid: dict  # IPLD link: {"/": "cid"}
-    ts: str  # ISO 8601 timestamp
-    prev: Optional[dict] = None  # IPLD link: {"/": "cid"} or null
-
 class Snapshot(BaseModel):
     schema: str = "arke/snapshot@v1"
     seq: int
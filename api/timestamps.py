@@ -0,0 +1,23 @@
+"""
+UTC timestamp formatting for event and pointer fields.
+
+Produces ISO 8601 strings with microseconds and a "Z" suffix
+(e.g. 2025-10-09T23:00:00.123456Z) without building a timezone-aware
+datetime and rewriting "+00:00" on every call.
+"""
+
+import time
+
+# Formatted "YYYY-MM-DDTHH:MM:SS" prefix for the most recent whole second
+_cached_second: int = -1
+_cached_prefix: str = ""
+
+
+def utc_now_iso() -> str:
+    """Current UTC time as ISO 8601 with microsecond precision and Z suffix."""
+    global _cached_second, _cached_prefix
+    seconds, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    if seconds != _cached_second:
+        _cached_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+        _cached_second = seconds
+    return f"{_cached_prefix}.{micros:06d}Z"
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Known-vector checks for the local dag-cbor encoder (api/dag_cbor.py).
+
+Event CIDs are computed locally and checked against what Kubo stores, so an
+encoding mismatch makes every event write fail. Vectors were derived by hand
+from the DAG-CBOR spec:
+1. Map keys sorted length-first, then bytewise
+2. Negative integers (major type 1) at each argument width
+3. null prev (first event in the chain)
+4. CID of the empty map
+"""
+
+import os
+import sys
+
+# api/ in a checkout, /app inside the API container
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, '/app')
+
+import dag_cbor
+
+# Colors
+BLUE = '\033[0;34m'
+GREEN = '\033[0;32m'
+RED = '\033[0;31m'
+NC = '\033[0m'
+
+def log(msg: str):
+    print(f"{BLUE}[INFO]{NC} {msg}", file=sys.stderr)
+
+def success(msg: str):
+    print(f"{GREEN}[SUCCESS]{NC} {msg}", file=sys.stderr)
+
+def error(msg: str):
+    print(f"{RED}[ERROR]{NC} {msg}", file=sys.stderr)
+
+
+# (description, value, expected encoding as hex)
+ENCODING_VECTORS = [
+    ("key order: shorter key first", {"b": 1, "aa": 2}, "a261620162616102"),
+    ("key order: same length bytewise", {"type": 1, "prev": 2}, "a2647072657602647479706501"),
+    ("negative ints: -1, -24, -25, -500", [-1, -24, -25, -500], "84203738183901f3"),
+    ("negative int: -65537", -65537, "3a00010000"),
+    ("null prev", {"prev": None}, "a16470726576f6"),
+    ("empty map", {}, "a0"),
+]
+
+# (description, value, expected CID)
+CID_VECTORS = [
+    ("empty map", {}, "bafyreigbtj4x7ip5legnfznufuopl4sg4knzc2cof6duas4b3q2fy6swua"),
+]
+
+# Keys of an arke/event@v1 event, in canonical order
+EVENT_KEY_ORDER = ["pi", "ts", "ver", "prev", "type", "schema", "tip_cid"]
+
+
+def main():
+    failures = 0
+
+    log("Checking encodings...")
+    for description, value, expected in ENCODING_VECTORS:
+        actual = dag_cbor.encode(value).hex()
+        if actual == expected:
+            success(f"{description}: {actual}")
+        else:
+            error(f"{description}: expected {expected}, got {actual}")
+            failures += 1
+
+    log("Checking CIDs...")
+    for description, value, expected in CID_VECTORS:
+        actual = dag_cbor.cid_for(dag_cbor.encode(value))
+        if actual == expected:
+            success(f"{description}: {actual}")
+        else:
+            error(f"{description}: expected {expected}, got {actual}")
+            failures += 1
+
+    log("Checking event key order...")
+    event = {
+        "schema": "arke/event@v1",
+        "type": "create",
+        "pi": "01K75HQQXNTDG7BBP7PS9AWYAN",
+        "ver": 1,
+        "tip_cid": {"/": "bafyreigbtj4x7ip5legnfznufuopl4sg4knzc2cof6duas4b3q2fy6swua"},
+        "ts": "2025-01-01T00:00:00Z",
+        "prev": None
+    }
+    block = dag_cbor.encode(event)
+    positions = [block.index(dag_cbor.encode(key)) for key in EVENT_KEY_ORDER]
+    if positions == sorted(positions):
+        success(f"Event keys encoded as {', '.join(EVENT_KEY_ORDER)}")
+    else:
+        error(f"Event keys out of canonical order (positions {positions})")
+        failures += 1
+
+    if failures:
+        error(f"{failures} vector(s) failed")
+        sys.exit(1)
+    success("All dag-cbor vectors match")
+
+
+if __name__ == "__main__":
+    main()